@@ -0,0 +1,84 @@
+import numpy as np
+import scipy.linalg
+
+
+def _solve_passive(AtA, Atb, passive):
+    """
+    Solve the unconstrained normal equations restricted to the passive set.
+    """
+    s = np.zeros(len(Atb))
+    if passive.any():
+        factor = scipy.linalg.cho_factor(AtA[np.ix_(passive, passive)])
+        s[passive] = scipy.linalg.cho_solve(factor, Atb[passive])
+    return s
+
+
+def default_tol(AtA):
+    """
+    Tolerance on the Lagrange multipliers used by fnnls unless one is given.
+    For a fixed A^T A it can be computed once and passed to every solve.
+    """
+    return 10*np.finfo(np.float64).eps*np.abs(AtA).sum(axis=0).max()*len(AtA)
+
+
+def fnnls(AtA, Atb, passive=None, tol=None, max_iter=None):
+    """
+    Fast non-negative least squares (Bro & de Jong, 1997) operating on the
+    normal equations, so that a fixed geometry matrix only has to be
+    multiplied out once. Starting from the passive set of a previous,
+    similar solution usually converges in a few iterations.
+
+    Args:
+        AtA: [float array] A^T A, shape (n, n), best given as float64 to
+             avoid a conversion on every call
+        Atb: [float array] A^T b, shape (n,)
+        passive: [bool array] initial guess for the set of positive entries
+        tol: [float] tolerance on the Lagrange multipliers
+        max_iter: [int] maximum number of outer iterations
+    Returns:
+        x: [float array] solution, shape (n,)
+        passive: [bool array] entries of x that are positive
+    """
+    AtA = np.asarray(AtA, dtype=np.float64)
+    Atb = np.asarray(Atb, dtype=np.float64)
+    n = len(Atb)
+    if tol is None:
+        tol = default_tol(AtA)
+    if max_iter is None:
+        max_iter = 3*n
+
+    # Make the warm start feasible by dropping entries that come out negative
+    if passive is None:
+        passive = np.zeros(n, dtype=bool)
+    else:
+        passive = np.array(passive, dtype=bool)
+    x = _solve_passive(AtA, Atb, passive)
+    while (x[passive] <= tol).any():
+        passive &= x > tol
+        x = _solve_passive(AtA, Atb, passive)
+
+    # Entries that were removed again right after being added are not
+    # selected again, which would otherwise repeat until max_iter
+    excluded = np.zeros(n, dtype=bool)
+    w = Atb - AtA.dot(x)
+    for _ in range(max_iter):
+        eligible = ~passive & ~excluded
+        if not eligible.any() or w[eligible].max() <= tol:
+            break
+        j = np.argmax(np.where(eligible, w, -np.inf))
+        passive[j] = True
+        s = _solve_passive(AtA, Atb, passive)
+
+        # Step back towards the previous solution while any entry is negative
+        while (s[passive] <= 0).any():
+            negative = passive & (s <= 0)
+            alpha = np.min(x[negative]/(x[negative] - s[negative]))
+            x += alpha*(s - x)
+            passive &= x > tol
+            s = _solve_passive(AtA, Atb, passive)
+        excluded[j] = not passive[j]
+        x = s
+        w = Atb - AtA.dot(x)
+
+    x[~passive] = 0
+    return x, passive
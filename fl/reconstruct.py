@@ -3,6 +3,7 @@ from phantom_viewer import acquire
 from phantom_viewer import process
 from phantom_viewer.fl import make_fl_images
 from phantom_viewer.fl import view
+from phantom_viewer.fl import fnnls
 import scipy.io.idl 
 import scipy.sparse
 import invert_fil_sart
@@ -60,7 +61,7 @@ def test_reconstruct():
     fl_images = np.load('../cache/fl_images_Xpt_1150611004_00.npy')
     frames = acquire.video(shot, 'phantom2', sub=20, sobel=False)
 
-    geomatrix = np.transpose(np.array([fl.flatten() for fl in fl_images]))
+    geomatrix = view.geometry_matrix(fl_images)
     target = frames[6249].flatten()
     ems, rnorm = scipy.optimize.nnls(geomatrix, target)
     reconstruction = geomatrix.dot(ems).reshape((64,64))
@@ -84,7 +85,7 @@ def test_reconstruct_smooth():
     frames = acquire.video(shot, 'phantom2', sub=20, sobel=False)
 
     lamda = 5000
-    geomatrix = np.transpose(np.array([fl.flatten() for fl in fl_images]))
+    geomatrix = view.geometry_matrix(fl_images)
     geomatrix_smooth = np.concatenate((geomatrix, lamda*np.identity(len(fl_images))))
     target = frames[6249]
     target_smooth = np.concatenate((target.flatten(), np.zeros(len(fl_images))))
@@ -110,12 +111,13 @@ def test_julia():
     fl_images = np.load('../cache/fl_images_Xpt_{}_{:02d}.npy'.format(shot, 0))
 
     if smoothing_param:
-        fl_matrix = np.transpose(np.array([fl.flatten() for fl in fl_images]))
+        fl_matrix = view.geometry_matrix(fl_images)
         fl_matrix = np.concatenate((fl_matrix, smoothing_param*np.identity(len(fl_images))))
-        frames_flattened = np.array([np.concatenate((f.flatten(), np.zeros(len(fl_images)))) for f in frames])
+        frames_flattened = np.zeros((len(frames), fl_matrix.shape[0]))
+        frames_flattened[:, :-len(fl_images)] = np.reshape(frames, (len(frames), -1))
     else:
-        fl_matrix = np.transpose(np.array([fl.flatten().astype(float) for fl in fl_images]))
-        frames_flattened = np.array([f.flatten().astype(float) for f in frames])
+        fl_matrix = view.geometry_matrix(fl_images, dtype=float)
+        frames_flattened = np.reshape(frames, (len(frames), -1)).astype(float)
     np.save('../cache/fl_matrix_Xpt_{}_{}.npy'.format(shot, 0), fl_matrix)
     np.save('../cache/frames_Xpt_{}_{}.npy'.format(shot, 0), frames_flattened)
 
@@ -125,12 +127,42 @@ def test_julia():
     os.system('rm -rf ../cache/fl_matrix_Xpt_{}*.npy'.format(shot))
 
 
-def write_nnls_reconstruction(shot, smoothing_param=100):
+def nnls_frames(fl_images, frames, smoothing_param=100):
+    """
+    Non-negative least squares reconstruction of a group of frames sharing
+    the same field line images. The normal matrix is formed once and the
+    right-hand sides of all frames come from a single matrix product; each
+    frame's solve is warm-started from the previous frame's passive set.
+
+    Args:
+        fl_images: [array] field line images, shape (fl_count, 64, 64)
+        frames: [array] phantom frames, shape (frame_count, 64, 64)
+        smoothing_param: [float] weight of the identity smoothing rows
+    Returns:
+        emissivities: [array] shape (frame_count, fl_count)
+    """
+    geomatrix = view.geometry_matrix(fl_images, dtype=np.float64)
+    AtA = geomatrix.T.dot(geomatrix)
+    AtA[np.diag_indices_from(AtA)] += smoothing_param**2
+    tol = fnnls.default_tol(AtA)
+    # Smoothing rows have zero targets so they do not contribute to AtB
+    AtB = np.reshape(frames, (len(frames), -1)).dot(geomatrix)
+    emissivities = np.empty(AtB.shape)
+    passive = None
+    for i, Atb in enumerate(AtB):
+        emissivities[i], passive = fnnls.fnnls(AtA, Atb, passive=passive, 
+                                               tol=tol)
+    return emissivities
+
+
+def write_nnls_reconstruction(shot, smoothing_param=100, julia=True):
     """
     Reconstruct entire shot and save field line emissivity profiles.
 
     Args:
         shot: [int] shot number
+        smoothing_param: [float] weight of the identity smoothing rows
+        julia: [bool] solve with nnls.jl instead of nnls_frames
     """
     # Change working directory to write cache files to correct locations
     old_working_dir = os.getcwd()
@@ -142,7 +174,7 @@ def write_nnls_reconstruction(shot, smoothing_param=100):
 
     # Group frames by nearest EFIT timestep
     efit_times = [round(t, 3) for t in acquire.times_efit(shot)]
-    phantom_efit_times = [efit_times[process.find_nearest(efit_times, t, ordered=True)] for t in phantom_times] 
+    phantom_efit_times = [efit_times[i] for i in process.find_nearest_ordered(efit_times, phantom_times)]
     efit_times = sorted([round(t, 3) for t in set(phantom_efit_times)])
     frames_grouped = [[] for i in range(len(efit_times))]
     for i, frame in enumerate(frames):
@@ -156,17 +188,26 @@ def write_nnls_reconstruction(shot, smoothing_param=100):
         make_fl_images.write(shot, efit_times)
         fl_files = sorted(glob.glob('../cache/fl_images_Xpt_{}*'.format(shot)))
 
+    if not julia:
+        for i, time in enumerate(efit_times):
+            fl_images = np.load('../cache/fl_images_Xpt_{}_{:02d}.npy'.format(shot, i))
+            emissivities = nnls_frames(fl_images, frames_grouped[i], smoothing_param)
+            np.save('../cache/fl_emissivities_Xpt_{}_sp{}_{:02d}.npy'.format(shot, smoothing_param, i), emissivities)
+        os.chdir(old_working_dir)
+        return
+
     # Save field line images and phantom frames for julia
     #efit_times = [efit_times[0]] # TEMPORARY PLS REMOVE ME LATER
     for i, time in enumerate(efit_times):
         fl_images = np.load('../cache/fl_images_Xpt_{}_{:02d}.npy'.format(shot, i))
         if smoothing_param:
-            fl_matrix = np.transpose(np.array([fl.flatten() for fl in fl_images]))
+            fl_matrix = view.geometry_matrix(fl_images)
             fl_matrix = np.concatenate((fl_matrix, smoothing_param*np.identity(len(fl_images))))
-            frames_flattened = np.array([np.concatenate((f.flatten(), np.zeros(len(fl_images)))) for f in frames_grouped[i]])
+            frames_flattened = np.zeros((len(frames_grouped[i]), fl_matrix.shape[0]))
+            frames_flattened[:, :-len(fl_images)] = np.reshape(frames_grouped[i], (len(frames_grouped[i]), -1))
         else:
-            fl_matrix = np.transpose(np.array([fl.flatten().astype(float) for fl in fl_images]))
-            frames_flattened = np.array([f.flatten().astype(float) for f in frames_grouped[i]])
+            fl_matrix = view.geometry_matrix(fl_images, dtype=float)
+            frames_flattened = np.reshape(frames_grouped[i], (len(frames_grouped[i]), -1)).astype(float)
         np.save('../cache/fl_matrix_Xpt_{}_{}.npy'.format(shot, i), fl_matrix)
         np.save('../cache/frames_Xpt_{}_{}.npy'.format(shot, i), frames_flattened)
 
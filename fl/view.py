@@ -3,15 +3,16 @@ import scipy.io.idl
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
-from matplotlib import animation
 from matplotlib.widgets import Slider, Button
 from phantom_viewer import acquire
 from phantom_viewer import signals
 from phantom_viewer import process
-import scipy.optimize
-import scipy.interpolate
+from phantom_viewer.fl import fnnls
+import scipy.linalg
+import scipy.sparse
+import scipy.spatial
 import glob
-import types
+import subprocess
 import gc
 
 
@@ -36,7 +37,89 @@ def make_colormap(seq):
     return matplotlib.colors.LinearSegmentedColormap('CustomMap', cdict)
 
 
-def slide_correlation(shot, fl_sav):
+def load_frames(shot):
+    """
+    Return background-subtracted divertor camera frames as a single contiguous
+    float32 array, together with a (frame, pixel) view of the same data.
+
+    Args:
+        shot: [int] shot number
+    """
+    frames = acquire.video(shot, 'phantom2', sub=20, sobel=False)
+    frames = np.ascontiguousarray(frames, dtype=np.float32)
+    return frames, frames.reshape(len(frames), -1)
+
+
+class Blitter(object):
+    """
+    Redraw only the artists that change on slider updates on top of a
+    background captured at every full draw of the figure, leaving static
+    artists such as flux contours and the machine cross section alone.
+    Colorbars are redrawn along with the artists, since their scale follows
+    the images. On backends that cannot blit, every update is a full draw.
+    """
+    def __init__(self, fig, artists, sliders=(), colorbars=()):
+        self.fig = fig
+        self.artists = list(artists)
+        self.background = None
+        self.blit = fig.canvas.supports_blit
+        if not self.blit:
+            return
+        for slider in sliders:
+            slider.drawon = False
+            self.artists.extend([slider.poly, slider.valtext])
+        self.artists.extend(c.ax for c in colorbars)
+        for artist in self.artists:
+            artist.set_animated(True)
+        fig.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+
+    def update(self, redraw=False):
+        # Changes to static artists are signaled by redraw and need a full draw
+        if redraw or self.background is None:
+            self.fig.canvas.draw_idle()
+            return
+        self.fig.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.fig.canvas.blit(self.fig.bbox)
+
+
+def throttle(fig, callback, interval=50):
+    """
+    Wrap a slider callback so that a burst of slider events, such as those
+    from dragging, runs it at most once per interval with the latest value.
+
+    Args:
+        fig: [matplotlib figure] figure whose canvas provides the timer
+        callback: [function] slider callback taking the slider value
+        interval: [int] minimum time between calls in milliseconds
+    """
+    pending = {'val': None, 'waiting': False}
+    timer = fig.canvas.new_timer(interval=interval)
+    timer.single_shot = True
+
+    def fire():
+        pending['waiting'] = False
+        callback(pending['val'])
+
+    def on_changed(val):
+        pending['val'] = val
+        if not pending['waiting']:
+            pending['waiting'] = True
+            timer.start()
+
+    timer.add_callback(fire)
+    return on_changed
+
+
+def slide_correlation(shot, fl_sav, shifted=False):
     """
     Slide through Phantom camera frames using given synthetic field line images 
     to create a reconstruction of the original using cross-correlation to find
@@ -45,30 +128,66 @@ def slide_correlation(shot, fl_sav):
     Args:
         shot: [int] shot number
         fl_sav: [scipy.io.idl.readsav object] containing field line images
+        shifted: [bool] score by the peak cross-correlation over all image
+                 shifts instead of the zero-shift value
     """
     time = acquire.gpi_series(shot, 'phantom2', 'time')
-    frames = acquire.video(shot, 'phantom2', sub=20, sobel=False)
+    frames, frames_flat = load_frames(shot)
     frame_index = 0
     fls = fl_sav.fl_image
     fl_r = fl_sav.fieldline_r
     fl_z = fl_sav.fieldline_z
     rlcfs, zlcfs = acquire.lcfs_rz(shot)
     efit_times, flux, flux_extent = acquire.time_flux_extent(shot)
-    efit_t_index = process.find_nearest(efit_times, time[0], ordered=True)
+    efit_t_indices = process.find_nearest_ordered(efit_times, time)
+    efit_t_index = efit_t_indices[0]
     machine_x, machine_y = acquire.machine_cross_section()
 
-    # Find cross-correlation scores between frames and field line images
-    xcorrs = np.zeros(fls.shape[0])
-    for i, fl in enumerate(fls):
-        xcorrs[i] = signals.cross_correlation(frames[frame_index], fl) 
-    indices = np.argsort(xcorrs)
+    # Find cross-correlation scores between frames and field line images as a
+    # matrix product of normalized fluctuations, or as a batch of FFT products
+    # when all shifts are considered. Zero-shift scores are found for a block
+    # of neighboring frames at once, so that each pass over the field line
+    # images serves the whole block
+    if shifted:
+        fls_fft = signals.padded_rfft2(fls)
+        block_size = 1
+    else:
+        fls_unit = signals.normalized_fluctuations(fls.reshape(len(fls), -1))
+        block_size = 16
+
+    def correlate(start, stop):
+        if shifted:
+            return [signals.cross_correlation_peaks(frames[start], fls_fft)]
+        frames_unit = signals.normalized_fluctuations(frames_flat[start:stop])
+        return frames_unit.dot(fls_unit.T)
+
+    # Scores and field line ranking are memoized per frame, so revisiting a
+    # frame with the slider or buttons is a lookup. Only the top ranks are
+    # sorted at first, and the ranking is extended when a lower rank is shown
+    scores = {}
+    top_count = 100
+
+    def score(frame_index, rank=0):
+        if frame_index not in scores:
+            start = frame_index - frame_index % block_size
+            stop = min(start + block_size, len(frames))
+            for i, xcorrs in enumerate(correlate(start, stop)):
+                scores.setdefault(start + i, (xcorrs, np.empty(0, dtype=int)))
+        xcorrs, indices = scores[frame_index]
+        if rank >= len(indices):
+            count = min(max(top_count, 2*(rank + 1)), len(xcorrs))
+            top = np.argpartition(xcorrs, len(xcorrs) - count)[len(xcorrs) - count:]
+            indices = top[np.argsort(xcorrs[top])[::-1]]
+            scores[frame_index] = xcorrs, indices
+        return xcorrs, indices
+
+    xcorrs, indices = score(frame_index)
 
     # Interpolate field line cross-correlation scores over R, Z grid
-    r_space = np.linspace(min(fl_r), max(fl_r), 100)
-    z_space = np.linspace(min(fl_z), max(fl_z), 100)
-    r_grid, z_grid = np.meshgrid(r_space, z_space)
-    xcorr_grid = matplotlib.mlab.griddata(fl_r, fl_z, xcorrs, r_grid, z_grid, 
-                                          interp='linear')
+    r_space, z_space, r_cells, z_cells = rz_grid(min(fl_r), max(fl_r), 
+                                                 min(fl_z), max(fl_z))
+    weights, outside = interpolation_matrix(fl_r, fl_z, r_cells, z_cells)
+    xcorr_cells = make_grid(weights, outside, xcorrs)
 
     # Plot camera image with field line overlay
     fig, ax = plt.subplots()
@@ -76,19 +195,24 @@ def slide_correlation(shot, fl_sav):
 
     plt.subplot(121)
     plt.title('Divertor camera view')
+    # Camera frames share one color scale over the whole shot, and each field
+    # line image's range is looked up, so neither is rescanned on updates
     plasma_image = plt.imshow(frames[frame_index], cmap=plt.cm.gray, 
-                              origin='bottom')
+                              origin='bottom', vmin=frames.min(), 
+                              vmax=frames.max())
+    fl_mins = fls.reshape(len(fls), -1).min(axis=1)
+    fl_maxs = fls.reshape(len(fls), -1).max(axis=1)
     overlay_cmap = make_colormap([(1., 0., 0., 0.), (1., 0., 0., 1.)])
-    fl_image = plt.imshow(fls[indices[-1]], cmap=overlay_cmap, origin='bottom',
+    fl_image = plt.imshow(fls[indices[0]], cmap=overlay_cmap, origin='bottom',
                           alpha=0.8)
     plt.axis('off')
 
     # Plot field line R, Z data in context of machine
     plt.subplot(122)
     plt.title('Toroidal cross section')
-    xcorr_image = plt.pcolormesh(r_grid, z_grid, xcorr_grid)
-    colorbar = plt.colorbar()
-    colorbar.set_label('Cross-correlation')
+    xcorr_image = show_grid(r_space, z_space, xcorr_cells)
+    xcorr_colorbar = plt.colorbar()
+    xcorr_colorbar.set_label('Cross-correlation')
     plt.plot(machine_x, machine_y, color='gray')
     l, = plt.plot(rlcfs[efit_t_index], zlcfs[efit_t_index], color='fuchsia')
     plt.axis('equal')
@@ -96,8 +220,10 @@ def slide_correlation(shot, fl_sav):
     plt.ylim([-.50, -.33])
     plt.xlabel('R (m)')
     plt.ylabel('Z (m)')
-    f, = plt.plot(fl_r[indices[-1]], fl_z[indices[-1]], 'ro')
-    plt.contour(flux[efit_t_index], 100, extent=flux_extent)
+    f, = plt.plot(fl_r[indices[0]], fl_z[indices[0]], 'ro')
+
+    flux_contours = FluxContours(plt.gca(), flux, flux_extent, 100, l, rlcfs, 
+                                 zlcfs, efit_t_index)
     
     # Slider and button settings
     fl_slide_area = plt.axes([0.20, 0.02, 0.60, 0.03])
@@ -113,43 +239,40 @@ def slide_correlation(shot, fl_sav):
     back_button_area = plt.axes([0.95, 0.01, 0.04, 0.04])
     back_button = Button(back_button_area, '<')
 
+    state = {'frame_index': frame_index, 'indices': indices}
+
     def update_data(val):
-        global frame_index, indices, xcorr_grid
-        frame_index = int(val)
-        for i, fl in enumerate(fls):
-            xcorrs[i] = signals.cross_correlation(frames[frame_index], fl) 
-        xcorr_grid = matplotlib.mlab.griddata(fl_r, fl_z, xcorrs, r_grid, 
-                                              z_grid, interp='linear')
-        indices = np.argsort(xcorrs)[::-1]
+        # Buttons can step past either end of the slider range
+        state['frame_index'] = int(np.clip(int(val), 0, len(frames) - 1))
+        xcorrs, state['indices'] = score(state['frame_index'])
+        make_grid(weights, outside, xcorrs, out=xcorr_cells)
         update_images(0)
     
     def update_images(val):
-        global frame_index, indices, xcorr_grid
-        val = int(val)
-        efit_t_index = process.find_nearest(efit_times, time[frame_index], ordered=True)
+        frame_index = state['frame_index']
+        rank = int(val)
+        if rank >= len(state['indices']):
+            _, state['indices'] = score(frame_index, rank)
+        fl_index = state['indices'][rank]
         plasma_image.set_array(frames[frame_index])
-        plasma_image.autoscale()
-        fl_image.set_array(fls[indices[val]])
-        fl_image.autoscale()
-        f.set_xdata(fl_r[indices[val]])
-        f.set_ydata(fl_z[indices[val]])
-        l.set_xdata(rlcfs[efit_t_index])
-        l.set_ydata(zlcfs[efit_t_index])
-        xcorr_image.set_array(xcorr_grid[:-1, :-1].ravel())
-        fig.canvas.draw_idle()
+        fl_image.set_array(fls[fl_index])
+        fl_image.set_clim(fl_mins[fl_index], fl_maxs[fl_index])
+        f.set_xdata(fl_r[fl_index])
+        f.set_ydata(fl_z[fl_index])
+        xcorr_image.set_data(xcorr_cells)
+        blitter.update(redraw=flux_contours.show(efit_t_indices[frame_index]))
 
     def forward(event):
-        global frame_index
-        frame_index += 1
-        update_data(frame_index)
+        update_data(state['frame_index'] + 1)
 
     def backward(event):
-        global frame_index
-        frame_index -= 1
-        update_data(frame_index)
+        update_data(state['frame_index'] - 1)
     
-    fl_slider.on_changed(update_images)
-    phantom_slider.on_changed(update_data)
+    blitter = Blitter(fig, [plasma_image, fl_image, xcorr_image, l, f], 
+                      sliders=[fl_slider, phantom_slider], 
+                      colorbars=[xcorr_colorbar])
+    fl_slider.on_changed(throttle(fig, update_images))
+    phantom_slider.on_changed(throttle(fig, update_data))
     forward_button.on_clicked(forward)
     back_button.on_clicked(backward)
 
@@ -161,8 +284,7 @@ def slide_reconstruct(shot, fl_sav, smoothing_param=100):
     """
     Slide through Phantom camera frames using given synthetic field line images 
     to create a reconstruction of the original using non-negative least squares
-    (NNLS) fitting. The NNLS method used here is slow, so there are long delays 
-    between clicks and interface updates.
+    (NNLS) fitting. Each frame's fit is warm-started from the previous one.
     
     Args:
         shot: [int] shot number
@@ -170,58 +292,92 @@ def slide_reconstruct(shot, fl_sav, smoothing_param=100):
         smoothing_param: [float] least-squares smoothing parameter
     """
     time = acquire.gpi_series(shot, 'phantom2', 'time')
-    frames = acquire.video(shot, 'phantom2', sub=20, sobel=False)
+    frames, frames_flat = load_frames(shot)
     frame_index = 0
     fl_images = fl_sav.fl_image
     fl_r = fl_sav.fieldline_r
     fl_z = fl_sav.fieldline_z
     rlcfs, zlcfs = acquire.lcfs_rz(shot)
     efit_times, flux, flux_extent = acquire.time_flux_extent(shot)
-    efit_t_index = process.find_nearest(efit_times, time[0], ordered=True)
+    efit_t_indices = process.find_nearest_ordered(efit_times, time)
+    efit_t_index = efit_t_indices[0]
     machine_x, machine_y = acquire.machine_cross_section()
 
-    inversion_func = scipy.optimize.nnls
-    geomatrix = np.transpose(np.array([fl.flatten() for fl in fl_images]))
-    geomatrix_smooth = np.concatenate((geomatrix, 
-                                       smoothing_param*np.identity(len(fl_images))))
+    # Single precision halves the memory traffic of the matrix products; the
+    # NNLS and Cholesky solves on the small normal equations are done in 
+    # double precision, with A^T A converted once
+    geomatrix = geometry_matrix(fl_images, dtype=np.float32)
+    # Only A^T b of the normal equations changes between frames. The identity
+    # smoothing rows of A only add smoothing_param**2 to the diagonal of A^T A 
+    # and contribute nothing to A^T b, so they are never formed
+    AtA = geomatrix.T.dot(geomatrix).astype(np.float64)
+    AtA[np.diag_indices_from(AtA)] += smoothing_param**2
+    nnls_tol = fnnls.default_tol(AtA)
+    passive = np.zeros(len(fl_images), dtype=bool)
+
+    # With enough smoothing the unconstrained least-squares solution is usually
+    # non-negative up to round-off, in which case it is also the NNLS solution
+    # and a single solve with the cached Cholesky factor suffices. Clipping
+    # negative entries whose total is below ridge_tol changes A^T A x by at
+    # most nnls_tol, so the result meets the same optimality conditions as 
+    # an fnnls solution
+    ridge_factor = scipy.linalg.cho_factor(AtA)
+    ridge_tol = nnls_tol/np.abs(AtA).sum(axis=0).max()
+
+    # A^T b is written into the same buffer for every frame
+    Atb = np.empty(len(fl_images), dtype=np.float32)
+
+    def invert(frame_index):
+        np.dot(frames_flat[frame_index], geomatrix, out=Atb)
+        emissivity = scipy.linalg.cho_solve(ridge_factor, Atb)
+        if np.minimum(emissivity, 0).sum() < -ridge_tol:
+            emissivity, passive[:] = fnnls.fnnls(AtA, Atb, passive=passive, 
+                                                 tol=nnls_tol)
+        else:
+            emissivity = np.maximum(emissivity, 0)
+            passive[:] = emissivity > 0
+        return emissivity.astype(np.float32)
+
     target = frames[0]
-    target_smooth = np.concatenate((target.flatten(), np.zeros(len(fl_images))))
-    inv = inversion_func(geomatrix_smooth, target_smooth)
-
-    r_space = np.linspace(min(fl_r), max(fl_r), 100)
-    z_space = np.linspace(min(fl_z), max(fl_z), 100)
-    r_grid, z_grid = np.meshgrid(r_space, z_space)
-    emissivity_grid = matplotlib.mlab.griddata(fl_r, fl_z, inv[0], r_grid,
-                                               z_grid, interp='linear') 
-
-    reconstructed = geomatrix.dot(inv[0])
-    reconstructed = reconstructed.reshape((64,64))
-    target = target.reshape((64,64))
+    emissivity = invert(0)
+
+    r_space, z_space, r_cells, z_cells = rz_grid(min(fl_r), max(fl_r), 
+                                                 min(fl_z), max(fl_z))
+    weights, outside = interpolation_matrix(fl_r, fl_z, r_cells, z_cells)
+    emissivity_cells = make_grid(weights, outside, emissivity)
+
+    # Reconstruction and error images are computed into the same buffers for
+    # every frame
+    reconstructed = np.empty(frames.shape[1:], dtype=np.float32)
+    error = np.empty(frames.shape[1:], dtype=np.float32)
+    np.dot(geomatrix, emissivity, out=reconstructed.reshape(-1))
+    np.subtract(target, reconstructed, out=error)
     fig, ax = plt.subplots()
     
     plt.subplot(221)
     plt.title('Divertor camera view')
-    plasma_image = plt.imshow(target, cmap=plt.cm.gist_heat, origin='bottom')
+    plasma_image = plt.imshow(target, cmap=plt.cm.gist_heat, origin='bottom',
+                              vmin=frames.min(), vmax=frames.max())
     plt.axis('off')
-    plt.colorbar()
+    plasma_colorbar = plt.colorbar()
     
     plt.subplot(222)
     plt.title('Reconstruction')
     reconstruction_image = plt.imshow(reconstructed, cmap=plt.cm.gist_heat, origin='bottom')
     plt.axis('off')
-    plt.colorbar()
+    reconstruction_colorbar = plt.colorbar()
     
     plt.subplot(223)
     plt.title('Reconstruction minus original')
-    error_image = plt.imshow(target - reconstructed, cmap=plt.cm.gist_heat, origin='bottom')
+    error_image = plt.imshow(error, cmap=plt.cm.gist_heat, origin='bottom')
     plt.axis('off')
-    plt.colorbar()
+    error_colorbar = plt.colorbar()
     
     plt.subplot(224)
     plt.title('Toroidal cross section')
-    emissivity_image = plt.pcolormesh(r_grid, z_grid, emissivity_grid)
-    colorbar = plt.colorbar()
-    colorbar.set_label('Relative emissivity')
+    emissivity_image = show_grid(r_space, z_space, emissivity_cells)
+    emissivity_colorbar = plt.colorbar()
+    emissivity_colorbar.set_label('Relative emissivity')
     plt.axis('equal')
     plt.plot(machine_x, machine_y, color='gray')
     l, = plt.plot(rlcfs[efit_t_index], zlcfs[efit_t_index], color='fuchsia')
@@ -229,7 +385,9 @@ def slide_reconstruct(shot, fl_sav, smoothing_param=100):
     plt.ylim([-.50, -.33])
     plt.xlabel('R (m)')
     plt.ylabel('Z (m)')
-    plt.contour(flux[efit_t_index], 100, extent=flux_extent)
+
+    flux_contours = FluxContours(plt.gca(), flux, flux_extent, 100, l, rlcfs, 
+                                 zlcfs, efit_t_index)
 
     phantom_slide_area = plt.axes([0.20, 0.02, 0.60, 0.03])
     phantom_slider = Slider(phantom_slide_area, 'Camera frame', 0, len(frames)-1,
@@ -240,39 +398,35 @@ def slide_reconstruct(shot, fl_sav, smoothing_param=100):
     back_button_area = plt.axes([0.95, 0.01, 0.04, 0.04])
     back_button = Button(back_button_area, '<')
 
+    state = {'frame_index': frame_index}
+
     def update_data(val):
-        global frame_index, emissivity_grid, reconstructed
-        frame_index = int(val)
-        target_smooth = np.concatenate((frames[frame_index].flatten(), np.zeros(len(fl_images))))
-        inv = inversion_func(geomatrix_smooth, target_smooth)
-        # inv = inversion_func(geomatrix, target)
-        reconstructed = geomatrix.dot(inv[0]).reshape((64,64))
-        emissivity_grid = matplotlib.mlab.griddata(fl_r, fl_z, inv[0], r_grid, 
-                                              z_grid, interp='linear')
+        frame_index = state['frame_index'] = int(val)
+        emissivity = invert(frame_index)
+        np.dot(geomatrix, emissivity, out=reconstructed.reshape(-1))
+        make_grid(weights, outside, emissivity, out=emissivity_cells)
+        np.subtract(frames[frame_index], reconstructed, out=error)
         plasma_image.set_array(frames[frame_index])
         reconstruction_image.set_array(reconstructed)
-        emissivity_image.set_array(emissivity_grid[:-1, :-1].ravel())
-        error_image.set_array(frames[frame_index]-reconstructed)
-        error_image.autoscale()
-        plasma_image.autoscale()
-        reconstruction_image.autoscale()
-        emissivity_image.autoscale()
-        efit_t_index = process.find_nearest(efit_times, time[frame_index], ordered=True)
-        l.set_xdata(rlcfs[efit_t_index])
-        l.set_ydata(zlcfs[efit_t_index])
-        fig.canvas.draw_idle()
+        rescale(reconstruction_image, reconstructed)
+        emissivity_image.set_data(emissivity_cells)
+        rescale(emissivity_image, emissivity)
+        error_image.set_array(error)
+        rescale(error_image, error)
+        blitter.update(redraw=flux_contours.show(efit_t_indices[frame_index]))
 
     def forward(event):
-        global frame_index
-        frame_index += 1
-        update_data(frame_index)
+        update_data(state['frame_index'] + 1)
 
     def backward(event):
-        global frame_index
-        frame_index -= 1
-        update_data(frame_index)
-
-    phantom_slider.on_changed(update_data)
+        update_data(state['frame_index'] - 1)
+
+    blitter = Blitter(fig, [plasma_image, reconstruction_image, error_image, 
+                            emissivity_image, l], 
+                      sliders=[phantom_slider], 
+                      colorbars=[plasma_colorbar, reconstruction_colorbar, 
+                                 error_colorbar, emissivity_colorbar])
+    phantom_slider.on_changed(throttle(fig, update_data))
     forward_button.on_clicked(forward)
     back_button.on_clicked(backward)
 
@@ -280,12 +434,190 @@ def slide_reconstruct(shot, fl_sav, smoothing_param=100):
     plt.show()
 
 
-def make_grid(rs, zs, r_grid, z_grid, values):
-    try:
-        return matplotlib.mlab.griddata(rs, zs, values, r_grid, z_grid, interp='linear') 
-    except:
-        points = np.array(zip(rs, zs), dtype=np.float)
-        return scipy.interpolate.griddata(points, values, (r_grid, z_grid), method='linear', fill_value=0)
+def geometry_matrix(fl_images, dtype=None):
+    """
+    Return the C-contiguous (pixel, field line) matrix whose columns are the
+    flattened field line images.
+
+    Args:
+        fl_images: [float array] field line images, shape (N, 64, 64)
+        dtype: [numpy dtype] type of the matrix, that of fl_images by default
+    """
+    fl_images = np.asarray(fl_images)
+    return np.ascontiguousarray(fl_images.reshape(len(fl_images), -1).T, 
+                                dtype=dtype)
+
+
+def interpolation_matrix(rs, zs, r_grid, z_grid):
+    """
+    Return the linear interpolation from scattered points onto a grid as a
+    sparse matrix of barycentric weights, so that the triangulation is only
+    done once for points that do not move between frames.
+
+    Args:
+        rs: [float array] R values of the scattered points
+        zs: [float array] Z values of the scattered points
+        r_grid: [float array] R values of the grid
+        z_grid: [float array] Z values of the grid
+    Returns:
+        weights: [scipy.sparse.csr_matrix] shape (grid size, number of points)
+        outside: [bool array] grid points outside the convex hull of the points
+    """
+    tri = scipy.spatial.Delaunay(np.column_stack((rs, zs)))
+    points = np.column_stack((np.ravel(r_grid), np.ravel(z_grid)))
+    simplices = tri.find_simplex(points)
+    outside = simplices == -1
+    transform = tri.transform[simplices]
+    bary = np.einsum('ijk,ik->ij', transform[:, :2], points - transform[:, 2])
+    vals = np.column_stack((bary, 1 - bary.sum(axis=1)))
+    vals[outside] = 0
+    rows = np.repeat(np.arange(len(points)), 3)
+    cols = tri.simplices[simplices].ravel()
+    weights = scipy.sparse.csr_matrix((vals.ravel().astype(np.float32), 
+                                       (rows, cols)),
+                                      shape=(len(points), len(rs)))
+    return weights, outside.reshape(np.shape(r_grid))
+
+
+def rescale(image, values):
+    """
+    Set the color limits of an image to the range of the given values. This
+    is one plain min/max pass instead of autoscale's masked-array pass over
+    the image data. For interpolated grids, the scattered values can be passed
+    since linear interpolation never leaves their range.
+    """
+    image.set_clim(np.min(values), np.max(values))
+
+
+def set_contours_visible(contour_set, visible):
+    """
+    Show or hide all lines of a contour set.
+    """
+    for c in contour_set.collections:
+        c.set_visible(visible)
+
+
+class FluxContours(object):
+    """
+    Flux contours and LCFS of the EFIT time being shown in a cross section.
+    Each EFIT time's contour set is made once and then swapped in and out by
+    visibility, and nothing is touched while the EFIT time stays the same.
+
+    Args:
+        ax: [matplotlib axes] cross section axes to draw contours in
+        flux: [float array] flux for each EFIT time
+        flux_extent: [list] R, Z extent of the flux arrays
+        levels: [int] number of contour levels
+        lcfs: [matplotlib line] line showing the LCFS
+        rlcfs: [float array] LCFS R values for each EFIT time
+        zlcfs: [float array] LCFS Z values for each EFIT time
+        efit_t_index: [int] EFIT time to show first
+        kwargs: passed on to contour
+    """
+    def __init__(self, ax, flux, flux_extent, levels, lcfs, rlcfs, zlcfs, 
+                 efit_t_index, **kwargs):
+        self.ax = ax
+        self.flux = flux
+        self.flux_extent = flux_extent
+        self.levels = levels
+        self.lcfs = lcfs
+        self.rlcfs = rlcfs
+        self.zlcfs = zlcfs
+        self.kwargs = kwargs
+        self.sets = {}
+        self.index = None
+        self.show(efit_t_index)
+
+    def show(self, efit_t_index):
+        """
+        Show the given EFIT time, returning whether it changed.
+        """
+        if efit_t_index == self.index:
+            return False
+        self.lcfs.set_data(self.rlcfs[efit_t_index], self.zlcfs[efit_t_index])
+        if self.index is not None:
+            set_contours_visible(self.sets[self.index], False)
+        if efit_t_index in self.sets:
+            set_contours_visible(self.sets[efit_t_index], True)
+        else:
+            self.sets[efit_t_index] = self.ax.contour(
+                self.flux[efit_t_index], self.levels, extent=self.flux_extent, 
+                **self.kwargs)
+        self.index = efit_t_index
+        return True
+
+
+def cell_centers(space):
+    """
+    Return the midpoints between consecutive cell corners along one axis of a
+    rectilinear grid, which are the pixel centers of show_grid images.
+    """
+    return (space[:-1] + space[1:])/2.
+
+
+def show_grid(r_space, z_space, cells, **kwargs):
+    """
+    Show values on the cells of an evenly spaced R, Z grid. An image with
+    the grid's extent is equivalent to a flat-shaded pcolormesh, but new
+    values only need set_data instead of rebuilding a mesh of quadrilaterals.
+
+    Args:
+        r_space: [float array] evenly spaced R values of the cell corners
+        z_space: [float array] evenly spaced Z values of the cell corners
+        cells: [float array] values with shape (len(z_space)-1, len(r_space)-1)
+        kwargs: passed on to imshow
+    """
+    return plt.imshow(cells, extent=(r_space[0], r_space[-1], z_space[0], 
+                                     z_space[-1]),
+                      origin='bottom', aspect='auto', interpolation='nearest', 
+                      **kwargs)
+
+
+# R, Z grids memoized by their limits, which are fixed for a shot
+_rz_grids = {}
+
+
+def rz_grid(r_min, r_max, z_min, z_max):
+    """
+    Return the 100 point R and Z axes of the grid on which profiles are shown
+    along with the R and Z values of its cell centers, where profiles are
+    interpolated. The arrays are shared between calls and are read-only.
+
+    Args:
+        r_min, r_max: [float] R limits of the grid
+        z_min, z_max: [float] Z limits of the grid
+    Returns:
+        r_space: [float array] R values of the cell corners, shape (100,)
+        z_space: [float array] Z values of the cell corners, shape (100,)
+        r_cells: [float array] R values of the cell centers, shape (99, 99)
+        z_cells: [float array] Z values of the cell centers, shape (99, 99)
+    """
+    key = (float(r_min), float(r_max), float(z_min), float(z_max))
+    if key not in _rz_grids:
+        r_space = np.linspace(r_min, r_max, 100, dtype=np.float32)
+        z_space = np.linspace(z_min, z_max, 100, dtype=np.float32)
+        r_cells, z_cells = np.meshgrid(cell_centers(r_space), 
+                                       cell_centers(z_space))
+        for a in (r_space, z_space, r_cells, z_cells):
+            a.flags.writeable = False
+        _rz_grids[key] = r_space, z_space, r_cells, z_cells
+    return _rz_grids[key]
+
+
+def make_grid(weights, outside, values, out=None):
+    """
+    Interpolate values at scattered points onto the grid described by the
+    output of interpolation_matrix, masking points outside the convex hull.
+    A masked array with the shape of outside may be given as out to be
+    overwritten instead of allocating a new one.
+    """
+    if out is None:
+        out = np.ma.masked_array(np.empty(outside.shape, dtype=np.float32), 
+                                 mask=outside.copy())
+    else:
+        out.mask = outside
+    out.data[...] = weights.dot(values).reshape(outside.shape)
+    return out
 
 
 def cutoff_array(values, cutoff):
@@ -299,6 +631,38 @@ def cutoff_array(values, cutoff):
         return temp
 
 
+def write_video(fig, update, num_frames, filename, fps=15, bitrate=5000):
+    """
+    Render a figure frame by frame and pipe the raw RGBA pixels straight to
+    ffmpeg, using the ffmpeg path and codec from matplotlib's rcParams.
+
+    Args:
+        fig: [matplotlib figure] figure with an Agg-based canvas
+        update: [function] called with each frame index to update the figure
+        num_frames: [int] number of frames to render
+        filename: [str] output video file
+        fps: [int] frames per second
+        bitrate: [int] video bitrate in kbit/s
+    """
+    fig.canvas.draw()
+    width, height = fig.canvas.get_renderer().get_canvas_width_height()
+    command = [matplotlib.rcParams['animation.ffmpeg_path'], '-y', 
+               '-f', 'rawvideo', '-pix_fmt', 'rgba', 
+               '-s', '{}x{}'.format(int(width), int(height)), 
+               '-r', str(fps), '-i', '-', 
+               '-vcodec', matplotlib.rcParams['animation.codec'], 
+               '-b:v', '{}k'.format(bitrate), filename]
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for frame_index in range(num_frames):
+            update(frame_index)
+            fig.canvas.draw()
+            proc.stdin.write(fig.canvas.buffer_rgba())
+    finally:
+        proc.stdin.close()
+        proc.wait()
+
+
 def slide_reconstruction(shot, smoothing_param=100, save=False):
     """
     Slide through Phantom camera frames and their reconstructions from
@@ -315,33 +679,67 @@ def slide_reconstruction(shot, smoothing_param=100, save=False):
     fl_image_files = sorted(glob.glob('../cache/fl_images_Xpt_{}_*'.format(shot)))
     if len(emissivity_files) == 0 or len(fl_data_files) == 0 or len(fl_image_files) == 0:
         raise Exception('Could not find files necessary to view reconstruction')
-    emissivities = [np.load(f) for f in emissivity_files]
+    emissivities = [np.load(f, mmap_mode='r') for f in emissivity_files]
     fl_data = [scipy.io.idl.readsav(f) for f in fl_data_files]
-    fl_images = [np.load(f) for f in fl_image_files]
+    fl_images = [np.load(f, mmap_mode='r') for f in fl_image_files]
     os.chdir(old_working_dir)
 
     frame_index = 0
     times = acquire.gpi_series(shot, 'phantom2', 'time')
-    frames = acquire.video(shot, 'phantom2', sub=20, sobel=False)
+    frames, _ = load_frames(shot)
     fl_rs = [f.fieldline_r for f in fl_data]
     fl_zs = [f.fieldline_z for f in fl_data]
     rlcfs, zlcfs = acquire.lcfs_rz(shot)
     efit_times, flux, flux_extent = acquire.time_flux_extent(shot)
     machine_x, machine_y = acquire.machine_cross_section()
-    efit_t_index = process.find_nearest(efit_times, times[0], ordered=True)
+    efit_t_indices = process.find_nearest_ordered(efit_times, times)
+    efit_t_index = efit_t_indices[0]
     efit_phantom_start_index = efit_t_index
-    previous_segments_frame_count = [sum([len(e) for e in emissivities[:t_index]]) for t_index in range(len(emissivities))]
-
-    geomatrices = [np.transpose(np.array([fl.flatten() for fl in fl_image_set])) for fl_image_set in fl_images]
-    reconstructed = geomatrices[0].dot(emissivities[0][0])
-    reconstructed = reconstructed.reshape((64,64))
-
-    fl_r_all = np.concatenate(fl_rs)
-    fl_z_all = np.concatenate(fl_zs)
-    r_space = np.linspace(np.min(fl_r_all), np.max(fl_r_all), 100)
-    z_space = np.linspace(np.min(fl_z_all), np.max(fl_z_all), 100)
-    r_grid, z_grid = np.meshgrid(r_space, z_space)
-    emissivity_grid = make_grid(fl_rs[0], fl_zs[0], r_grid, z_grid, emissivities[0][0])
+    segment_lengths = np.fromiter((len(e) for e in emissivities), dtype=int, 
+                                  count=len(emissivities))
+    previous_segments_frame_count = np.concatenate(([0], np.cumsum(segment_lengths)[:-1]))
+    frame_segments = np.repeat(np.arange(len(emissivities)), segment_lengths)
+
+    # Reconstructions of all frames in an EFIT segment come from a single
+    # matrix product, stored as (frame, pixel). Segments are only set up when
+    # first shown, so that startup does not read the whole memory-mapped cache
+    segments = {}
+
+    def segment(efit_rel_index):
+        if efit_rel_index not in segments:
+            geomatrix = geometry_matrix(fl_images[efit_rel_index], 
+                                        dtype=np.float32)
+            emissivity_set = np.asarray(emissivities[efit_rel_index], 
+                                        dtype=np.float32)
+            segments[efit_rel_index] = geomatrix, emissivity_set.dot(geomatrix.T)
+        return segments[efit_rel_index]
+
+    # Reconstruction and its residual are written into the same buffers on
+    # every update instead of allocating new images
+    reconstructed = np.empty((64,64), dtype=np.float32)
+    error = np.empty_like(reconstructed)
+
+    def reconstruct(efit_rel_index, frame_rel_index, frame, emissivity=None):
+        """
+        Use the precomputed reconstruction unless a modified emissivity
+        profile is given.
+        """
+        geomatrix, reconstructions = segment(efit_rel_index)
+        if emissivity is None:
+            np.copyto(reconstructed.reshape(-1), reconstructions[frame_rel_index])
+        else:
+            np.dot(geomatrix, emissivity.astype(np.float32, copy=False), 
+                   out=reconstructed.reshape(-1))
+        np.subtract(frame, reconstructed, out=error)
+
+    reconstruct(0, 0, frames[0])
+
+    r_space, z_space, r_cells, z_cells = rz_grid(
+        min(r.min() for r in fl_rs), max(r.max() for r in fl_rs), 
+        min(z.min() for z in fl_zs), max(z.max() for z in fl_zs))
+    interpolations = [interpolation_matrix(fl_r, fl_z, r_cells, z_cells) 
+                      for fl_r, fl_z in zip(fl_rs, fl_zs)]
+    emissivity_cells = make_grid(*interpolations[0], values=emissivities[0][0])
     
     # Draw figure using first frame
     fig, ax = plt.subplots()
@@ -350,7 +748,8 @@ def slide_reconstruction(shot, smoothing_param=100, save=False):
 
     plt.subplot(221)
     plt.title('Divertor camera view')
-    plasma_image = plt.imshow(frames[0], cmap=plt.cm.gist_heat, origin='bottom')
+    plasma_image = plt.imshow(frames[0], cmap=plt.cm.gist_heat, origin='bottom',
+                              vmin=frames.min(), vmax=frames.max())
     plt.axis('off')
     #plt.colorbar()
     
@@ -362,13 +761,14 @@ def slide_reconstruction(shot, smoothing_param=100, save=False):
     
     plt.subplot(223)
     plt.title('Original minus reconstruction')
-    error_image = plt.imshow(frames[0] - reconstructed, cmap=plt.cm.gist_heat, origin='bottom')
+    error_image = plt.imshow(error, cmap=plt.cm.gist_heat, origin='bottom')
     plt.axis('off')
     #plt.colorbar()
     
     plt.subplot(224)
     plt.title('Toroidal cross section')
-    emissivity_image = plt.pcolormesh(r_grid, z_grid, emissivity_grid, cmap=plt.cm.plasma)
+    emissivity_image = show_grid(r_space, z_space, emissivity_cells, 
+                                 cmap=plt.cm.plasma)
     #colorbar = plt.colorbar()
     #colorbar.set_label('Relative emissivity')
     plt.axis('equal')
@@ -379,9 +779,11 @@ def slide_reconstruction(shot, smoothing_param=100, save=False):
     plt.ylim([-.50, -.33])
     plt.xlabel('R (m)')
     plt.ylabel('Z (m)')
-    plt.contour(flux[efit_t_index], 300, extent=flux_extent, alpha=0.5)
     plt.gca().set_axis_bgcolor('black')
 
+    flux_contours = FluxContours(plt.gca(), flux, flux_extent, 300, l, rlcfs, 
+                                 zlcfs, efit_t_index, alpha=0.5)
+
     if not save:
         phantom_slide_area = plt.axes([0.20, 0.02, 0.60, 0.03])
         phantom_slider = Slider(phantom_slide_area, 'Camera frame', 0, len(frames)-1,
@@ -395,53 +797,56 @@ def slide_reconstruction(shot, smoothing_param=100, save=False):
         back_button_area = plt.axes([0.95, 0.01, 0.04, 0.04])
         back_button = Button(back_button_area, '<')
 
+    state = {'frame_index': frame_index}
+
     def update_frame(val):
-        global efit_t_index, frame_index
-        frame_index = int(val)
-        cutoff = cutoff_slider.val
+        frame_index = state['frame_index'] = int(val)
+        cutoff = 0 if save else cutoff_slider.val
 
         # Recalculate things
-        efit_t_index = process.find_nearest(efit_times, times[frame_index], ordered=True)
-        efit_rel_index = efit_t_index - efit_phantom_start_index
+        efit_t_index = efit_t_indices[frame_index]
+        efit_rel_index = frame_segments[frame_index]
         frame_rel_index = frame_index - previous_segments_frame_count[efit_rel_index]
         emissivity_cutoff = cutoff_array(emissivities[efit_rel_index][frame_rel_index], cutoff)
-        emissivity_grid = make_grid(fl_rs[efit_rel_index], fl_zs[efit_rel_index], r_grid, z_grid, emissivity_cutoff) 
-        reconstructed = geomatrices[efit_rel_index].dot(emissivity_cutoff).reshape((64,64))
+        make_grid(*interpolations[efit_rel_index], values=emissivity_cutoff, 
+                  out=emissivity_cells)
+        reconstruct(efit_rel_index, frame_rel_index, frames[frame_index], 
+                    emissivity_cutoff if cutoff else None)
 
         # Update canvas
         plasma_image.set_array(frames[frame_index])
-        plasma_image.autoscale()
         reconstruction_image.set_array(reconstructed)
-        reconstruction_image.autoscale()
-        emissivity_image.set_array(emissivity_grid[:-1, :-1].ravel())
-        emissivity_image.autoscale()
-        error_image.set_array(frames[frame_index] - reconstructed)
-        error_image.autoscale()
-        l.set_xdata(rlcfs[efit_t_index])
-        l.set_ydata(zlcfs[efit_t_index])
+        rescale(reconstruction_image, reconstructed)
+        emissivity_image.set_data(emissivity_cells)
+        rescale(emissivity_image, emissivity_cutoff)
+        error_image.set_array(error)
+        rescale(error_image, error)
+        contours_changed = flux_contours.show(efit_t_index)
         title.set_text('Shot {} frame {}'.format(shot, frame_index))
+        if not save:
+            blitter.update(redraw=contours_changed)
 
     def forward(event):
-        global frame_index
-        phantom_slider.set_val(frame_index + 1)
+        phantom_slider.set_val(state['frame_index'] + 1)
 
     def backward(event):
-        global frame_index
-        phantom_slider.set_val(frame_index - 1)
+        phantom_slider.set_val(state['frame_index'] - 1)
 
     def update_cutoff(val):
-        global frame_index
-        update_frame(frame_index)
+        update_frame(state['frame_index'])
 
     if save:
-        FFMpegWriter = animation.writers['ffmpeg']
-        writer = FFMpegWriter(fps=15, bitrate=5000)
-        anim = animation.FuncAnimation(fig, update_frame, frames=1000, interval=5, blit=False)
-        anim.save('{}_sp{}.avi'.format(shot, smoothing_param), writer=writer)
+        write_video(fig, update_frame, 1000, 
+                    '{}_sp{}.avi'.format(shot, smoothing_param))
         plt.close(fig)
     else:
-        phantom_slider.on_changed(update_frame)
-        cutoff_slider.on_changed(update_cutoff)
+        # Animated artists are left out of full draws, so blitting is only
+        # set up for interactive use and not for writing videos
+        blitter = Blitter(fig, [plasma_image, reconstruction_image, error_image,
+                                emissivity_image, l, title], 
+                          sliders=[phantom_slider, cutoff_slider])
+        phantom_slider.on_changed(throttle(fig, update_frame))
+        cutoff_slider.on_changed(throttle(fig, update_cutoff))
         forward_button.on_clicked(forward)
         back_button.on_clicked(backward)
         plt.show()
@@ -449,23 +854,22 @@ def slide_reconstruction(shot, smoothing_param=100, save=False):
 
 def animate_emissivity(shot, num_frames=1000, smoothing_param=100, highres=False):
         
-    def setvisible(self, vis):
-        for c in self.collections: c.set_visible(vis)
-        
-    def setanimated(self, ani):
-        for c in self.collections: c.set_animated(ani)
-        
     # Read cache files broken up by EFIT time segment
     old_working_dir = os.getcwd()
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     emissivity_files = sorted(glob.glob('../cache/fl_emissivities_Xpt_{}_sp{}_*'.format(shot, smoothing_param)))
-    emissivities = [np.load(f) for f in emissivity_files]
+    emissivities = [np.load(f, mmap_mode='r') for f in emissivity_files]
     fl_data_files = sorted(glob.glob('../cache/fl_data_Xpt_{}_*'.format(shot)))
     fl_data = [scipy.io.idl.readsav(f) for f in fl_data_files]
     os.chdir(old_working_dir)
     fl_rs = [f.fieldline_r for f in fl_data]
     fl_zs = [f.fieldline_z for f in fl_data]
     rlcfs, zlcfs = acquire.lcfs_rz(shot, highres=highres)
+    if highres:
+        # High resolution LCFS arrays are (point, time); make each time a
+        # contiguous row like the standard resolution ones
+        rlcfs = np.ascontiguousarray(rlcfs.T)
+        zlcfs = np.ascontiguousarray(zlcfs.T)
 
     # Get standard data
     times = acquire.gpi_series(shot, 'phantom2', 'time')
@@ -477,75 +881,73 @@ def animate_emissivity(shot, num_frames=1000, smoothing_param=100, highres=False
     efit_times, flux, flux_extent = acquire.time_flux_extent(shot, highres=False)
     if highres:
         efit_times_highres, flux, _ = acquire.time_flux_extent(shot, highres=True)
-        efit_t_index_highres = process.find_nearest(efit_times_highres, times[0], ordered=True)
-    efit_t_index = process.find_nearest(efit_times, times[0], ordered=True)
-    efit_phantom_start_index = efit_t_index
-    previous_segments_frame_count = [sum([len(e) for e in emissivities[:t_index]]) for t_index in range(len(emissivities))]
-    frame_index = 0
+        efit_t_indices_highres = process.find_nearest_ordered(efit_times_highres, times)
+    efit_t_indices = process.find_nearest_ordered(efit_times, times)
+    segment_lengths = np.fromiter((len(e) for e in emissivities), dtype=int, 
+                                  count=len(emissivities))
+    previous_segments_frame_count = np.concatenate(([0], np.cumsum(segment_lengths)[:-1]))
+    frame_segments = np.repeat(np.arange(len(emissivities)), segment_lengths)
 
     # Set up grid on which to display emissivity profile
-    fl_r_all = np.concatenate(fl_rs)
-    fl_z_all = np.concatenate(fl_zs)
-    r_space = np.linspace(np.min(fl_r_all), np.max(fl_r_all), 100)
-    z_space = np.linspace(np.min(fl_z_all), np.max(fl_z_all), 100)
-    r_grid, z_grid = np.meshgrid(r_space, z_space)
-    emissivity_grid = matplotlib.mlab.griddata(fl_rs[0], fl_zs[0], emissivities[0][0], r_grid, z_grid, interp='linear') 
+    r_space, z_space, r_cells, z_cells = rz_grid(
+        min(r.min() for r in fl_rs), max(r.max() for r in fl_rs), 
+        min(z.min() for z in fl_zs), max(z.max() for z in fl_zs))
+    interpolations = [interpolation_matrix(fl_r, fl_z, r_cells, z_cells) 
+                      for fl_r, fl_z in zip(fl_rs, fl_zs)]
+    emissivity_cells = make_grid(*interpolations[0], values=emissivities[0][0])
+
+    # Interpolate the emissivity profiles of all frames to be animated at once,
+    # one sparse matrix product per EFIT segment
+    emissivity_grids = np.empty((num_frames, r_cells.size), dtype=np.float32)
+    for efit_rel_index, (weights, _) in enumerate(interpolations):
+        start = previous_segments_frame_count[efit_rel_index]
+        count = min(len(emissivities[efit_rel_index]), num_frames - start)
+        if count <= 0:
+            break
+        emissivity_grids[start:start+count] \
+            = weights.dot(emissivities[efit_rel_index][:count].T).T
+    emissivity_grids = emissivity_grids.reshape((num_frames,) + r_cells.shape)
+    emissivity_range = emissivity_grids.min(), emissivity_grids.max()
 
     # Plotting setup
     fig, ax = plt.subplots()
-    emissivity_image = plt.pcolormesh(r_grid, z_grid, emissivity_grid, cmap=plt.cm.plasma)
+    emissivity_image = show_grid(r_space, z_space, emissivity_cells, 
+                                 cmap=plt.cm.plasma)
+    emissivity_image.set_clim(*emissivity_range)
     plt.axis('equal')
     plt.xlim([.49, .62])
     plt.ylim([-.50, -.33])
     plt.xlabel('R (m)')
     plt.ylabel('Z (m)')
     plt.gca().set_axis_bgcolor('black')
-    machine, = plt.plot(machine_x, machine_y, color='gray')
-    
-    previous_efit_t_index = -1
-    plots = [0]*num_frames
-    
-    # Compute plot elements for each frame
-    for frame_index in range(num_frames):
-        efit_t_index = process.find_nearest(efit_times, times[frame_index], ordered=True)
-        efit_rel_index = efit_t_index - efit_phantom_start_index
-        frame_rel_index = frame_index - previous_segments_frame_count[efit_rel_index]
-        
-        # Plot emissivity grid
-        emissivity_grid = matplotlib.mlab.griddata(fl_rs[efit_rel_index], fl_zs[efit_rel_index], emissivities[efit_rel_index][frame_rel_index], r_grid, z_grid, interp='linear') 
-        emissivity_image = plt.pcolormesh(r_grid, z_grid, emissivity_grid, cmap=plt.cm.plasma)
-        emissivity_image.autoscale()
+    plt.plot(machine_x, machine_y, color='gray')
+    lcfs, = plt.plot([], [], color='orange', alpha=0.5)
+    title = ax.text(0.02, 0.95, '', color='white', transform=ax.transAxes)
+    contours = {'index': -1, 'flux_surfaces': None}
+
+    def update(frame_index):
+        efit_t_index = efit_t_indices[frame_index]
+        efit_rel_index = frame_segments[frame_index]
+        emissivity_cells.mask = interpolations[efit_rel_index][1]
+        emissivity_cells.data[...] = emissivity_grids[frame_index]
+        emissivity_image.set_data(emissivity_cells)
         
-        # Plot LCFS and flux contours
+        # Update LCFS and redraw flux contours only when the EFIT time changes
         if highres:
-            efit_t_index_highres = process.find_nearest(efit_times_highres, times[frame_index], ordered=True)
-            if efit_t_index_highres > previous_efit_t_index:
-                lcfs, = plt.plot(rlcfs[:, efit_t_index_highres], zlcfs[:, efit_t_index_highres], color='orange', alpha=0.5)
-                flux_surfaces = plt.contour(flux[efit_t_index_highres], 300, extent=flux_extent, alpha=0.5)               
-                # Monkey patch to enable animation for QuadContourSet objects
-                flux_surfaces.set_visible = types.MethodType(setvisible, flux_surfaces)
-                flux_surfaces.set_animated = types.MethodType(setanimated, flux_surfaces)
-                flux_surfaces.axes = plt.gca()
-                previous_efit_t_index = efit_t_index_highres
-        elif efit_t_index > previous_efit_t_index:
-            lcfs, = plt.plot(rlcfs[efit_t_index], zlcfs[efit_t_index], color='orange', alpha=0.5)
-            flux_surfaces = plt.contour(flux[efit_t_index], 300, extent=flux_extent, alpha=0.5)       
-            # Monkey patch to enable animation for QuadContourSet objects
-            flux_surfaces.set_visible = types.MethodType(setvisible,flux_surfaces)
-            flux_surfaces.set_animated = types.MethodType(setanimated,flux_surfaces)
-            flux_surfaces.axes = plt.gca()
-            previous_efit_t_index = efit_t_index
+            efit_t_index = efit_t_indices_highres[frame_index]
+        if efit_t_index != contours['index']:
+            lcfs.set_data(rlcfs[efit_t_index], zlcfs[efit_t_index])
+            if contours['flux_surfaces'] is not None:
+                for c in contours['flux_surfaces'].collections: c.remove()
+            contours['flux_surfaces'] = ax.contour(flux[efit_t_index], 300, 
+                                                   extent=flux_extent, alpha=0.5)
+            contours['index'] = efit_t_index
             
-        text = 'Shot {} frame {}'.format(shot, frame_index)
-        axtext = ax.text(90, 90, text)
-        annotation = ax.annotate(text, xy=(0.35, 1.05), xycoords='axes fraction')
-        plots[frame_index] = [lcfs, flux_surfaces, emissivity_image, machine, axtext, annotation]
+        title.set_text('Shot {} frame {}'.format(shot, frame_index))
 
     # Save animation to file
-    FFMpegWriter = animation.writers['ffmpeg']
-    writer = FFMpegWriter(fps=15, bitrate=5000)
-    anim = animation.ArtistAnimation(fig, plots, interval=5, blit=False)
-    anim.save('{}_sp{}_emissivity.avi'.format(shot, smoothing_param), writer=writer)
+    write_video(fig, update, num_frames, 
+                '{}_sp{}_emissivity.avi'.format(shot, smoothing_param))
     plt.close(fig)
 
    
@@ -36,6 +36,24 @@ def find_nearest(array, value, ordered=False):
         return np.abs(array - value).argmin()
 
 
+def find_nearest_ordered(array, values):
+    """
+    Find indices of values in an ordered array closest to each of the given
+    values, so that a whole time base can be looked up once in advance.
+    Parameters
+        array: NumPy array, sorted in increasing order
+        values: NumPy array
+    Returns
+        NumPy array: arguments of array values closest to values supplied
+    """
+    array = np.asarray(array)
+    values = np.asarray(values)
+    if len(array) == 1:
+        return np.zeros(values.shape, dtype=int)
+    idx = np.clip(np.searchsorted(array, values, side="left"), 1, len(array)-1)
+    return idx - (np.fabs(values - array[idx-1]) < np.fabs(values - array[idx]))
+
+
 def flip_horizontal(frames):
     """
     Flip frame array horizontally.
@@ -61,15 +61,68 @@ def cross_correlation(a, b, lag=0):
     b_mean = b.mean()
     a_fluct = a - a_mean
     b_fluct = b - b_mean
-    denom = np.sqrt(np.sum(a_fluct**2)*np.sum(b_fluct**2))
+    denom = np.sqrt(np.vdot(a_fluct, a_fluct)*np.vdot(b_fluct, b_fluct))
     if denom == 0: 
         return 0
     if lag == 0: 
-        return np.sum(a_fluct*b_fluct)/denom 
+        return np.vdot(a_fluct, b_fluct)/denom 
     elif lag < 0: 
-        return np.sum((a[-lag:] - a_mean)*(b[:lag] - b_mean))/denom
+        return np.vdot(a_fluct[-lag:], b_fluct[:lag])/denom
     elif lag > 0: 
-        return np.sum((a[:-lag] - a_mean)*(b[lag:] - b_mean))/denom
+        return np.vdot(a_fluct[:-lag], b_fluct[lag:])/denom
+
+
+def normalized_fluctuations(a):
+    """
+    Subtract the mean along the last axis and scale to unit norm, so that the
+    zero-lag cross-correlation of two such arrays is just their dot product.
+    Rows without fluctuations are left as zeros, matching cross_correlation.
+    Parameters
+        a: NumPy array, one signal per row along the last axis
+    Returns
+        NumPy array: float32 normalized fluctuations with the shape of a
+    """
+    fluct = np.asarray(a, dtype=np.float32)
+    fluct = fluct - fluct.mean(axis=-1, keepdims=True)
+    norm = np.sqrt(np.sum(fluct**2, axis=-1, keepdims=True))
+    norm[norm == 0] = 1
+    return fluct/norm
+
+
+def padded_rfft2(images):
+    """
+    Fourier transforms of the normalized fluctuations of 2D images, zero-padded
+    to twice their size so that products of them give non-circular
+    cross-correlations. Transforms of a fixed set of images can be kept and
+    passed to cross_correlation_peaks.
+    Parameters
+        images: NumPy array with dimension (..., y pixels, x pixels)
+    Returns
+        NumPy array: complex64 transforms of dimension (..., 2*y, x + 1)
+    """
+    images = np.asarray(images)
+    ny, nx = images.shape[-2:]
+    fluct = normalized_fluctuations(images.reshape(images.shape[:-2] + (-1,)))
+    # Transform rows first and columns second: the padding rows are all zero,
+    # so only the ny original rows need a row transform
+    rows = np.fft.rfft(fluct.reshape(images.shape), n=2*nx, axis=-1)
+    return np.fft.fft(rows, n=2*ny, axis=-2).astype(np.complex64)
+
+
+def cross_correlation_peaks(a, bs_fft):
+    """
+    Maximum over all 2D shifts of the normalized cross-correlation between an
+    image and each of a batch of images, computed with FFTs. At zero shift 
+    this is the same normalization as cross_correlation.
+    Parameters
+        a: NumPy array with dimension (y pixels, x pixels)
+        bs_fft: NumPy array, padded_rfft2 of images with the same shape as a
+    Returns
+        NumPy array: peak cross-correlation for each image in the batch
+    """
+    shape = (bs_fft.shape[-2], 2*(bs_fft.shape[-1] - 1))
+    corr = np.fft.irfft2(np.conj(bs_fft)*padded_rfft2(a), s=shape)
+    return corr.reshape(len(corr), -1).max(axis=1)
 
 
 def PS_error(signal, nperseg=256, noverlap=None):